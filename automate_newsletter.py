@@ -1,14 +1,19 @@
 import os
 import re
-from datetime import datetime, timedelta
+import heapq
+from datetime import datetime, date, timedelta
 from zoneinfo import ZoneInfo
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator
 
 import pandas as pd
 from mailchimp_marketing import Client
 
 from get_latest_campaign import get_latest_campaign
-from extract_excel import get_first_30_rows_from_excel
+from extract_excel import iter_excel_chunks
+from campaign_archive import open_archive, sync_archive, latest_archived_campaign, event_already_ran
+from link_checker import check_event_links
+from template_regions import find_header_span, find_events_region
+from profiling import stage
 
 from mailchimp_marketing.api_client import ApiClientError
 
@@ -43,6 +48,14 @@ DIVIDER_HTML = (
 )
 
 
+# Full event blocks shown in the newsletter; further upcoming events go to the "more events" digest
+MAX_EVENTS = 30
+MAX_MORE_EVENTS = 20
+
+# An archived source campaign older than this is probably missing newer sends; use the live API instead
+ARCHIVE_MAX_AGE = timedelta(days=7)
+
+
 DATE_RE = re.compile(r"(January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2}(st|nd|rd|th),\s+\d{4}")
 
 def _pick_header_section_key(sections: Dict[str, str]) -> Optional[str]:
@@ -182,11 +195,46 @@ def map_columns(df: pd.DataFrame) -> Dict[str, str]:
     return mapping
 
 
-def parse_upcoming_events(df: pd.DataFrame) -> List[Dict[str, str]]:
+def select_upcoming_rows(chunks: Iterable[pd.DataFrame], k: Optional[int] = MAX_EVENTS,
+                         today: Optional[date] = None) -> pd.DataFrame:
+    """
+    Scan the whole sheet chunk by chunk and keep only the k soonest upcoming rows, sorted by date
+    (sheet order breaks ties). A bounded heap keeps memory proportional to k, not the sheet size.
+    Pass k=None to keep every upcoming row.
+    """
+    today_et = today or datetime.now(ZoneInfo("America/New_York")).date()
+    columns = None
+    date_col = None
+    # Max-heap on (date, row number) via negated keys, so the latest kept row is popped first
+    heap: List[Tuple[int, int, tuple]] = []
+    seq = 0
+    for chunk in chunks:
+        if columns is None:
+            columns = list(chunk.columns)
+            date_col = map_columns(chunk).get("date")
+            if date_col is None:
+                return chunk.iloc[0:0]
+        dates = pd.to_datetime(chunk[date_col], errors="coerce")
+        for d, row in zip(dates, chunk.itertuples(index=False, name=None)):
+            seq += 1
+            if pd.isna(d) or d.date() <= today_et:
+                continue
+            item = (-d.toordinal(), -seq, row)
+            if k is None or len(heap) < k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+    if columns is None:
+        return pd.DataFrame()
+    rows = [row for _, _, row in sorted(heap, reverse=True)]
+    return pd.DataFrame.from_records(rows, columns=columns)
+
+
+def parse_upcoming_events(df: pd.DataFrame, today: Optional[date] = None) -> List[Dict[str, str]]:
     mapping = map_columns(df)
     # Parse dates and filter strictly future (upcoming)
     # Using Eastern today
-    today_et = datetime.now(ZoneInfo("America/New_York")).date()
+    today_et = today or datetime.now(ZoneInfo("America/New_York")).date()
     # Convert date column
     date_col = mapping.get("date")
     if date_col is None:
@@ -255,176 +303,115 @@ def build_event_block(event: Dict[str, str]) -> str:
 '''
 
 
-def find_nth(hay: str, needle: str, n: int, start: int = 0) -> int:
-    idx = start
-    for _ in range(n):
-        idx = hay.find(needle, idx)
-        if idx == -1:
-            return -1
-        idx += len(needle)
-    return idx - len(needle)
-
-
-def find_table_block_bounds(html: str, table_start_idx: int) -> Tuple[int, int]:
-    """Return (start, end) indices for the outer <table ...>...</table> block starting at given '<table' index."""
-    start = html.rfind("<table", 0, table_start_idx + 1)
-    if start == -1:
-        start = table_start_idx
-    depth = 0
-    i = start
-    token_re = re.compile(r"<table|</table>", re.IGNORECASE)
-    for m in token_re.finditer(html, i):
-        token = m.group(0).lower()
-        if token == "<table":
-            depth += 1
-            if depth == 1:
-                start = m.start()
-        else:
-            depth -= 1
-            if depth == 0:
-                end = m.end()
-                return (start, end)
-    return (start, start)
-
-
-def find_divider_table_open_start(html: str, class_idx: int) -> int:
-    """Given an index of 'class="mcnDividerBlock"', find the opening '<table' start of that divider block."""
-    i = class_idx
-    while True:
-        lt = html.rfind('<table', 0, i + 1)
-        if lt == -1:
-            return -1
-        gt = html.find('>', lt)
-        if gt == -1:
-            return -1
-        opening = html[lt:gt].lower()
-        if 'class="mcndividerblock"' in opening:
-            return lt
-        # keep searching earlier tables
-        i = lt - 1
-
-
-
-def find_enclosing_table_open(html: str, pos: int) -> int:
-    """Find the opening index of the outermost <table ...> whose bounds enclose pos.
-    Returns -1 if not found.
+def build_more_events_block(events: List[Dict[str, str]], more_link: str = "") -> str:
+    """Compact "More Upcoming Events" digest (date + linked title per line) for overflow events."""
+    def esc(s: str) -> str:
+        return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+    link_style = "mso-line-height-rule: exactly;-ms-text-size-adjust: 100%;-webkit-text-size-adjust: 100%;color: #0c89e9;font-weight: normal;text-decoration: underline;"
+    lines = []
+    for ev in events:
+        title = esc(ev.get("title") or "")
+        link = ev.get("link") or ""
+        title_html = f'<a href="{esc(link)}" style="{link_style}">{title}</a>' if link else title
+        lines.append(f'<strong>{esc(ev.get("date_disp") or "")}</strong> &ndash; {title_html}')
+    if more_link:
+        lines.append(f'<a href="{esc(more_link)}" style="{link_style}">See all upcoming events</a>')
+
+    return f'''
+<table border="0" cellpadding="0" cellspacing="0" width="100%" class="mcnTextBlock" style="min-width: 100%;border-collapse: collapse;mso-table-lspace: 0pt;mso-table-rspace: 0pt;-ms-text-size-adjust: 100%;-webkit-text-size-adjust: 100%;"><tbody class="mcnTextBlockOuter"><tr><td valign="top" class="mcnTextBlockInner" style="padding-top: 9px;mso-line-height-rule: exactly;-ms-text-size-adjust: 100%;-webkit-text-size-adjust: 100%;">
+<table align="left" border="0" cellpadding="0" cellspacing="0" width="100%" class="mcnTextContentContainer" style="max-width: 100%;min-width: 100%;border-collapse: collapse;mso-table-lspace: 0pt;mso-table-rspace: 0pt;-ms-text-size-adjust: 100%;-webkit-text-size-adjust: 100%;"><tbody><tr>
+<td valign="top" class="mcnTextContent" style="padding: 0px 18px 9px;font-family: &quot;Helvetica Neue&quot;, Helvetica, Arial, Verdana, sans-serif;font-size: 14px;line-height: 150%;text-align: left;mso-line-height-rule: exactly;-ms-text-size-adjust: 100%;-webkit-text-size-adjust: 100%;word-break: break-word;color: #000000;">
+<h1 class="null" style="text-align: center;display: block;margin: 0;padding: 0;color: #000000;font-family: 'Helvetica Neue', Helvetica, Arial, Verdana, sans-serif;font-size: 26px;font-style: normal;font-weight: bold;line-height: 125%;letter-spacing: normal;">More Upcoming Events</h1>
+<p style="text-align: left;font-family: &quot;Helvetica Neue&quot;, Helvetica, Arial, Verdana, sans-serif;font-size: 14px;line-height: 150%;margin: 10px 0;padding: 0;mso-line-height-rule: exactly;-ms-text-size-adjust: 100%;-webkit-text-size-adjust: 100%;color: #000000;">{"<br>".join(lines)}</p>
+</td></tr></tbody></table>
+</td></tr></tbody></table>
+'''
+
+
+# (start, end, replacement pieces): replace html[start:end] of the ORIGINAL buffer with the pieces
+HtmlEdit = Tuple[int, int, List[str]]
+
+
+def build_html_edits(header_span: Optional[Tuple[int, int]], events_region: Optional[Tuple[int, int]],
+                     header_date_str: str, events: List[Dict[str, str]],
+                     more_events: Optional[List[Dict[str, str]]] = None, more_link: str = "") -> List[HtmlEdit]:
     """
-    # Walk backwards through table openings until we find one whose closing </table> is after pos
-    search_end = pos
-    while True:
-        t_open = html.rfind('<table', 0, search_end)
-        if t_open == -1:
-            return -1
-        t_start, t_end = find_table_block_bounds(html, t_open)
-        if t_end > pos >= t_start:
-            # Found a table that encloses pos; try to see if there is a larger enclosing one
-            # Continue searching before this start to see if there's an outer table also enclosing pos
-            outer_open = html.rfind('<table', 0, t_start)
-            if outer_open == -1:
-                return t_start
-            outer_bounds = find_table_block_bounds(html, outer_open)
-            if outer_bounds[1] > pos >= outer_bounds[0]:
-                # Move outward
-                search_end = outer_open
-                continue
-            else:
-                return t_start
-        else:
-            # Move further back
-            search_end = t_open
-
-
-def update_html(current_html: str, header_date_str: str, events: List[Dict[str, str]]) -> str:
-    html = current_html
-
-    # 1) Update header date inside #templateHeader (the span with font-size:24px)
-    header_idx = html.find('id="templateHeader"')
-    if header_idx != -1:
-        # limit search to a window after header_idx
-        window_end = html.find('id="templateBody"', header_idx)
-        window_end = window_end if window_end != -1 else header_idx + 8000
-        window = html[header_idx:window_end]
-        span_re = re.compile(r"(<span[^>]*font-size:\s*24px[^>]*>)(.*?)(</span>)", re.IGNORECASE | re.DOTALL)
-        def _repl(m):
-            return m.group(1) + header_date_str + m.group(3)
-        new_window, n = span_re.subn(_repl, window, count=1)
-        if n:
-            html = html[:header_idx] + new_window + html[header_idx + len(window):]
-        else:
-            print("[WARN] Could not locate header date span; leaving as-is.")
-    else:
-        print("[WARN] #templateHeader not found; leaving header date unchanged.")
-
-    # 2) Replace events section between the two top dividers and the divider before Mantra block
-    body_idx = html.find('id="templateBody"')
-    if body_idx == -1:
-        print("[WARN] #templateBody not found; skipping events replacement.")
-        return html
-
-    # Find first two mcnDividerBlock occurrences after body
-    first_div_class_idx = html.find('class="mcnDividerBlock"', body_idx)
-    second_div_class_idx = html.find('class="mcnDividerBlock"', first_div_class_idx + 1) if first_div_class_idx != -1 else -1
-    if first_div_class_idx == -1 or second_div_class_idx == -1:
-        print("[WARN] Could not find two top divider blocks; skipping events replacement.")
-        return html
-
-    # Compute the exact end of the second divider table
-    second_div_open = find_divider_table_open_start(html, second_div_class_idx)
-    if second_div_open == -1:
-        print("[WARN] Could not find opening <table for the second divider; skipping events replacement.")
-        return html
-    start_delete_bounds = find_table_block_bounds(html, second_div_open)
-    start_delete = start_delete_bounds[1]  # after the second divider table
-
-    # Find Mantra block heading
-    mantra_idx = html.lower().find("access support with mantra health".lower(), start_delete)
-    if mantra_idx == -1:
-        print("[WARN] Mantra Health block not found; skipping events replacement.")
-        return html
-
-    # Iterate to find the divider that is immediately above the Mantra block
-    scan_pos = start_delete
-    last_div_open = -1
-    while True:
-        idx = html.find('class="mcnDividerBlock"', scan_pos)
-        if idx == -1 or idx >= mantra_idx:
-            break
-        div_open = find_divider_table_open_start(html, idx)
-        if div_open != -1:
-            last_div_open = div_open
-        scan_pos = idx + 1
-
-    if last_div_open == -1:
-        print("[WARN] Divider above Mantra not found during scan; skipping events replacement.")
-        return html
-
-    end_delete_bounds = find_table_block_bounds(html, last_div_open)
-    # end_delete should be the start of the divider table RIGHT BEFORE the Mantra section,
-    # so deletion will remove everything up to (but not including) that divider.
-    end_delete = end_delete_bounds[0]
-
-    # If there is any stray content like a 'right-variant' block still between end_delete and the Mantra heading,
-    # broaden to the enclosing table that contains the Mantra heading and step back to the previous divider.
-    # (Safety: only do this if we still detect the "Stay Healthy" headline in between.)
-    probe_text = html[end_delete:mantra_idx]
-    if "Stay Healthy" in probe_text or "Connected This Summer" in probe_text:
-        # Move end_delete earlier to the last divider before mantra (already is), but ensure we did not start too late
-        # by recapturing the enclosing table of the Mantra heading and not overlapping.
-        enclosing_open = find_enclosing_table_open(html, mantra_idx)
-        if enclosing_open != -1 and enclosing_open < mantra_idx and enclosing_open > end_delete:
-            end_delete = enclosing_open
+    Build the header-date and events-section edits for slot bounds already located with
+    find_header_span / find_events_region, so one template can be rendered many times without
+    searching it again. Either bound may be None to leave that part untouched.
+    """
+    edits: List[HtmlEdit] = []
+    if header_span:
+        edits.append((header_span[0], header_span[1], [header_date_str]))
+    if events_region is None:
+        return edits
+    start_delete, end_delete = events_region
 
     # Build replacement for events area: event block + divider for each event
-    events_html = ""
+    pieces: List[str] = []
     for ev in events:
-        block = build_event_block(ev)
-        events_html += block + DIVIDER_HTML
+        pieces += [build_event_block(ev), DIVIDER_HTML]
+    if more_events or more_link:
+        pieces += [build_more_events_block(more_events or [], more_link), DIVIDER_HTML]
+
+    if edits and edits[-1][1] > start_delete:
+        raise RuntimeError("Header date span overlaps the events section; refusing to splice.")
+    edits.append((start_delete, end_delete, pieces))
+    return edits
+
+
+def plan_html_edits(html: str, header_date_str: str, events: List[Dict[str, str]],
+                    more_events: Optional[List[Dict[str, str]]] = None, more_link: str = "") -> List[HtmlEdit]:
+    """
+    Work out the header-date and events-section replacements as edits against the original html,
+    without building any intermediate copy of the document. Edits are sorted and non-overlapping.
+    """
+    return build_html_edits(find_header_span(html), find_events_region(html),
+                            header_date_str, events, more_events, more_link)
+
+
+def apply_html_edits(html: str, edits: List[HtmlEdit]) -> Iterator[str]:
+    """Yield the edited document piece by piece; each untouched span of html is copied exactly once."""
+    pos = 0
+    for start, end, pieces in edits:
+        yield html[pos:start]
+        yield from pieces
+        pos = end
+    yield html[pos:]
+
+
+def iter_update_html(current_html: str, header_date_str: str, events: List[Dict[str, str]],
+                     more_events: Optional[List[Dict[str, str]]] = None, more_link: str = "") -> Iterator[str]:
+    """Streaming form of update_html: yields the updated document in chunks (e.g. for write_html)."""
+    return apply_html_edits(current_html, plan_html_edits(current_html, header_date_str, events, more_events, more_link))
 
-    new_html = html[:start_delete] + events_html + html[end_delete:]
-    return new_html
 
+def update_html(current_html: str, header_date_str: str, events: List[Dict[str, str]],
+                more_events: Optional[List[Dict[str, str]]] = None, more_link: str = "") -> str:
+    return "".join(iter_update_html(current_html, header_date_str, events, more_events, more_link))
 
-def replicate_update_and_optionally_schedule(excel_url: str, dry_run: bool = True) -> Optional[str]:
+
+def write_html(path: str, chunks: Iterable[str]) -> None:
+    """Stream HTML chunks straight to a file without joining them first."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(chunks)
+
+
+def _archived_age(send_time: str) -> Optional[timedelta]:
+    try:
+        sent = datetime.fromisoformat((send_time or "").replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if sent.tzinfo is None:
+        sent = sent.replace(tzinfo=ZoneInfo("UTC"))
+    return datetime.now(ZoneInfo("UTC")) - sent
+
+
+def replicate_update_and_optionally_schedule(excel_url: str, dry_run: bool = True,
+                                             archive_path: Optional[str] = None,
+                                             more_link: str = "",
+                                             rewrite_links: bool = False) -> Optional[str]:
     # Compute target date and schedule time
     excel_url = "https://penno365-my.sharepoint.com/:x:/g/personal/gapsa_pr_gapsa_upenn_edu/EWx0O2kdYFxOtPh92obhyNwBL73UMrhbNMyzRKcYLO87wA?download=1"
     tmr = tomorrow_eastern()
@@ -433,15 +420,36 @@ def replicate_update_and_optionally_schedule(excel_url: str, dry_run: bool = Tru
     subject = f"✉️GAPSA Newsletter - {header_date}"
     schedule_iso = schedule_time_iso_9am_eastern(tmr)
 
-    # Fetch latest sent campaign
-    latest = get_latest_campaign()
-    if not latest:
-        print("No campaigns found to replicate.")
-        return None
-    source_id = latest["id"]
+    # Pick the source campaign from the local archive when one is given (after pulling in
+    # anything sent since the last sync), otherwise fetch the latest sent campaign live.
+    archive = open_archive(archive_path) if archive_path else None
+    if archive:
+        with stage("api: sync archive"):
+            try:
+                sync_archive(archive)
+            except Exception as e:
+                print(f"[WARN] Could not sync campaign archive, using it as-is: {e}")
+    archived = latest_archived_campaign(archive) if archive else None
+    if archived:
+        age = _archived_age(archived["send_time"])
+        if age is None or age > ARCHIVE_MAX_AGE:
+            print(f"[WARN] Latest archived campaign {archived['id']} was sent {archived['send_time'] or 'at an unknown time'}; "
+                  f"archive looks stale, fetching the source campaign live instead.")
+            archived = None
+    if archived:
+        source_id = archived["id"]
+        src = archived["meta"]
+        print(f"[DEBUG] Using archived campaign {source_id} (sent {archived['send_time']}) as source.")
+    else:
+        with stage("api: fetch source campaign"):
+            latest = get_latest_campaign()
+            if not latest:
+                print("No campaigns found to replicate.")
+                return None
+            source_id = latest["id"]
+            src = mailchimp.campaigns.get(source_id)
 
     # Create a brand-new campaign (no template), cloning key settings from latest
-    src = mailchimp.campaigns.get(source_id)
     list_id = (src.get("recipients") or {}).get("list_id")
     if not list_id:
         raise RuntimeError("Could not read list_id from latest campaign.")
@@ -468,37 +476,57 @@ def replicate_update_and_optionally_schedule(excel_url: str, dry_run: bool = Tru
         # "tracking": src.get("tracking") or {},
     }
 
-    new_campaign = mailchimp.campaigns.create(payload)
+    with stage("api: create campaign"):
+        new_campaign = mailchimp.campaigns.create(payload)
     new_id = new_campaign["id"]
     print(f"Created new campaign (no template): {new_id}")
 
 
     # Update settings (title, subject)
-    mailchimp.campaigns.update(new_id, {"settings": {"title": title, "subject_line": subject}})
+    with stage("api: update settings"):
+        mailchimp.campaigns.update(new_id, {"settings": {"title": title, "subject_line": subject}})
     print(f"Updated settings: title='{title}', subject='{subject}'")
 
     # Build from the SOURCE campaign's HTML (the template you like)
-    src_content = mailchimp.campaigns.get_content(source_id)
-    source_html = src_content.get("html", "") or ""
+    if archived:
+        source_html = archived["html"]
+    else:
+        with stage("api: fetch source content"):
+            src_content = mailchimp.campaigns.get_content(source_id)
+        source_html = src_content.get("html", "") or ""
     if not source_html:
         raise RuntimeError("Latest campaign has empty HTML; nothing to base the new email on.")
 
-    # Read Excel and prepare events
-    df = get_first_30_rows_from_excel(excel_url)
-    events = parse_upcoming_events(df)
+    # Scan the whole sheet, keeping only the soonest upcoming events; the ones past
+    # MAX_EVENTS go into the compact "more events" digest instead of full blocks.
+    with stage("excel: download + select"):
+        df = select_upcoming_rows(iter_excel_chunks(excel_url), k=MAX_EVENTS + MAX_MORE_EVENTS)
+    with stage("parse_upcoming_events"):
+        events = parse_upcoming_events(df)
+    # Flag dead registration links (and optionally skip redirect hops) before rendering
+    with stage("link check"):
+        events = check_event_links(events, rewrite=rewrite_links)
+    events, more_events = events[:MAX_EVENTS], events[MAX_EVENTS:]
 
     # Optional safety: don't schedule an empty newsletter
     if not events:
         print("No upcoming events found; not scheduling.")
         return None
 
+    if archive:
+        repeats = [ev["title"] for ev in events if event_already_ran(archive, ev["title"], ev["link"])]
+        if repeats:
+            print(f"[DEBUG] {len(repeats)} event(s) already featured in earlier issues: {repeats}")
+
     # Update the SOURCE HTML to tomorrow's header + new events
-    updated_html = update_html(source_html, header_date, events)
+    # Edits are planned once against the source buffer, then streamed to the artifact
+    with stage("update_html"):
+        edits = plan_html_edits(source_html, header_date, events, more_events, more_link)
 
     # Always write a local preview artifact for review
     os.makedirs("artifacts", exist_ok=True)
-    with open(os.path.join("artifacts", f"proposed_{new_id}.html"), "w", encoding="utf-8") as f:
-        f.write(updated_html)
+    with stage("update_html: write artifact"):
+        write_html(os.path.join("artifacts", f"proposed_{new_id}.html"), apply_html_edits(source_html, edits))
 
     # Respect dry_run: do not touch Mailchimp content or schedule
     if dry_run:
@@ -506,10 +534,15 @@ def replicate_update_and_optionally_schedule(excel_url: str, dry_run: bool = Tru
         return new_id
 
     # --- Real update path (no template sections) ---
-    mailchimp.campaigns.set_content(new_id, {"html": updated_html})
+    # The Mailchimp client serializes the body as JSON, so the upload needs the joined string
+    with stage("update_html: join for upload"):
+        updated_html = "".join(apply_html_edits(source_html, edits))
+    with stage("api: set_content"):
+        mailchimp.campaigns.set_content(new_id, {"html": updated_html})
 
     # Verify on server
-    verify = mailchimp.campaigns.get_content(new_id)
+    with stage("api: verify content"):
+        verify = mailchimp.campaigns.get_content(new_id)
     final_blob = verify.get("html", "") or ""
     header_html = format_header_date(tmr)
 
@@ -524,7 +557,8 @@ def replicate_update_and_optionally_schedule(excel_url: str, dry_run: bool = Tru
         f.write(final_blob)
 
     # Schedule for tomorrow 9 AM Eastern
-    mailchimp.campaigns.schedule(new_id, {"schedule_time": schedule_iso})
+    with stage("api: schedule"):
+        mailchimp.campaigns.schedule(new_id, {"schedule_time": schedule_iso})
     print(f"Scheduled campaign at {schedule_iso} (America/New_York)")
 
 
@@ -0,0 +1,301 @@
+import os
+import re
+import json
+import html as htmllib
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Optional, Any
+
+from mailchimp_marketing import Client
+from dotenv import load_dotenv
+
+from template_regions import TABLE_TOKEN_RE, PROMO_HEADLINES, find_events_region
+
+# load values from .env into the environment
+load_dotenv()
+
+MAILCHIMP_API_KEY = os.getenv("MAILCHIMP_API_KEY")
+MAILCHIMP_SERVER_PREFIX = os.getenv("MAILCHIMP_SERVER_PREFIX", "us6")
+
+ARCHIVE_PATH = os.path.join("artifacts", "campaign_archive.sqlite3")
+
+# Mailchimp caps campaigns.list at 1000 items per page
+PAGE_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    id TEXT PRIMARY KEY,
+    send_time TEXT,
+    title TEXT,
+    subject TEXT,
+    meta TEXT,
+    html TEXT
+);
+CREATE INDEX IF NOT EXISTS campaigns_send_time ON campaigns(send_time);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    campaign_id TEXT NOT NULL REFERENCES campaigns(id),
+    position INTEGER NOT NULL,
+    title TEXT,
+    title_norm TEXT,
+    link TEXT,
+    body TEXT
+);
+CREATE INDEX IF NOT EXISTS events_title_norm ON events(title_norm);
+CREATE INDEX IF NOT EXISTS events_link ON events(link);
+CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+    title, body, content='events', content_rowid='id'
+);
+"""
+
+CAPTION_MARKER = 'class="mcnCaptionBlock"'
+COMMENT_RE = re.compile(r"<!--.*?-->", re.DOTALL)
+HEADING_RE = re.compile(r"<h[1-4][^>]*>(.*?)</h[1-4]>", re.IGNORECASE | re.DOTALL)
+HREF_RE = re.compile(r'<a[^>]+href="([^"]+)"', re.IGNORECASE)
+TAG_RE = re.compile(r"<[^>]+>")
+
+
+def _client() -> Client:
+    # A fresh client per call so worker threads don't share one connection pool
+    mc = Client()
+    mc.set_config({
+        "api_key": MAILCHIMP_API_KEY,
+        "server": MAILCHIMP_SERVER_PREFIX,
+    })
+    return mc
+
+
+def _text(fragment: str) -> str:
+    return re.sub(r"\s+", " ", htmllib.unescape(TAG_RE.sub(" ", fragment))).strip()
+
+
+def normalize_title(title: str) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", htmllib.unescape(title or "").lower()).strip()
+
+
+def open_archive(path: str = ARCHIVE_PATH) -> sqlite3.Connection:
+    """Open (and create if needed) the local campaign archive."""
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def extract_event_blocks(html: str) -> List[Dict[str, str]]:
+    """
+    Pull the event blocks (tables marked with class="mcnCaptionBlock") out of a campaign's events
+    section, the same region plan_html_edits replaces. Caption blocks outside it and the seasonal
+    wellness promo are skipped, so standing content isn't indexed as events.
+    :return: List of dicts with title, link and plain-text body, in document order
+    """
+    region = find_events_region(html, warn=False)
+    if region is None:
+        return []
+    region_start, region_end = region
+    # MSO conditional comments contain unbalanced <table> tags; blank them out (same length)
+    # so the depth count below stays correct and offsets still line up with the original.
+    html = COMMENT_RE.sub(lambda m: " " * len(m.group(0)), html)
+    blocks: List[Dict[str, str]] = []
+    pos = html.find(CAPTION_MARKER, region_start, region_end)
+    while pos != -1:
+        start = html.rfind("<table", 0, pos)
+        end = -1
+        depth = 0
+        for m in TABLE_TOKEN_RE.finditer(html, start):
+            depth += 1 if m.group(0).lower() == "<table" else -1
+            if depth == 0:
+                end = m.end()
+                break
+        # Blocks that run past the region (the Mantra block around its end) aren't events
+        if start == -1 or end == -1 or end > region_end:
+            break
+        block = html[start:end]
+        # Event titles are usually <h1>, but older blocks use other levels and a leading &nbsp; <h4>
+        title = next((t for t in (_text(h) for h in HEADING_RE.findall(block)) if t.strip("\xa0 ")), "")
+        href = HREF_RE.search(block)
+        if title and not any(p in block for p in PROMO_HEADLINES):
+            blocks.append({
+                "title": title,
+                "link": htmllib.unescape(href.group(1)) if href else "",
+                "body": _text(block),
+            })
+        pos = html.find(CAPTION_MARKER, end, region_end)
+    return blocks
+
+
+def _store_campaign(conn: sqlite3.Connection, campaign: Dict[str, Any], html: str) -> int:
+    settings = campaign.get("settings") or {}
+    cid = campaign["id"]
+    with conn:
+        old = [r["id"] for r in conn.execute("SELECT id FROM events WHERE campaign_id = ?", (cid,))]
+        for rowid in old:
+            conn.execute(
+                "INSERT INTO events_fts(events_fts, rowid, title, body) "
+                "SELECT 'delete', id, title, body FROM events WHERE id = ?",
+                (rowid,),
+            )
+        conn.execute("DELETE FROM events WHERE campaign_id = ?", (cid,))
+        conn.execute(
+            "INSERT OR REPLACE INTO campaigns (id, send_time, title, subject, meta, html) VALUES (?, ?, ?, ?, ?, ?)",
+            (cid, campaign.get("send_time") or "", settings.get("title"), settings.get("subject_line"),
+             json.dumps(campaign), html),
+        )
+        events = extract_event_blocks(html)
+        for i, ev in enumerate(events):
+            cur = conn.execute(
+                "INSERT INTO events (campaign_id, position, title, title_norm, link, body) VALUES (?, ?, ?, ?, ?, ?)",
+                (cid, i, ev["title"], normalize_title(ev["title"]), ev["link"], ev["body"]),
+            )
+            conn.execute(
+                "INSERT INTO events_fts(rowid, title, body) VALUES (?, ?, ?)",
+                (cur.lastrowid, ev["title"], ev["body"]),
+            )
+    return len(events)
+
+
+def _list_page(offset: int, since: Optional[str]) -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = {
+        "status": "sent",
+        "sort_field": "send_time",
+        "sort_dir": "ASC",
+        "count": PAGE_SIZE,
+        "offset": offset,
+    }
+    if since:
+        kwargs["since_send_time"] = since
+    return _client().campaigns.list(**kwargs)
+
+
+def _fetch_html(campaign_id: str) -> str:
+    return _client().campaigns.get_content(campaign_id).get("html", "") or ""
+
+
+def list_sent_campaigns(since: Optional[str] = None, max_workers: int = 4) -> List[Dict[str, Any]]:
+    """
+    List sent campaigns (optionally only those sent after `since`), fetching pages concurrently.
+    :return: Campaign dicts as returned by campaigns.list, oldest first
+    """
+    first = _list_page(0, since)
+    campaigns = list(first.get("campaigns") or [])
+    total = first.get("total_items") or len(campaigns)
+    offsets = range(PAGE_SIZE, total, PAGE_SIZE)
+    if offsets:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for page in pool.map(lambda off: _list_page(off, since), offsets):
+                campaigns.extend(page.get("campaigns") or [])
+    return campaigns
+
+
+def last_synced_send_time(conn: sqlite3.Connection) -> Optional[str]:
+    row = conn.execute("SELECT MAX(send_time) AS t FROM campaigns WHERE send_time != ''").fetchone()
+    return row["t"] if row else None
+
+
+def _pending_campaigns(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    rows = conn.execute("SELECT meta FROM campaigns WHERE html IS NULL ORDER BY send_time").fetchall()
+    return [json.loads(r["meta"]) for r in rows]
+
+
+def sync_archive(conn: sqlite3.Connection, max_workers: int = 4) -> int:
+    """
+    Pull campaigns sent since the last sync into the archive. Listing pages and campaign HTML
+    are fetched concurrently; each campaign is committed as soon as its HTML arrives.
+    Newly listed campaigns are first recorded as placeholder rows (html NULL), so a failed fetch
+    or an interrupted sync is retried on the next run instead of being skipped past.
+    :return: Number of campaigns added
+    """
+    since = last_synced_send_time(conn)
+    known = {r["id"] for r in conn.execute("SELECT id FROM campaigns")}
+    new = [c for c in list_sent_campaigns(since, max_workers=max_workers) if c["id"] not in known]
+    with conn:
+        for c in new:
+            settings = c.get("settings") or {}
+            conn.execute(
+                "INSERT OR IGNORE INTO campaigns (id, send_time, title, subject, meta, html) VALUES (?, ?, ?, ?, ?, NULL)",
+                (c["id"], c.get("send_time") or "", settings.get("title"), settings.get("subject_line"), json.dumps(c)),
+            )
+    pending = _pending_campaigns(conn)
+    if not pending:
+        print("[DEBUG] Campaign archive already up to date.")
+        return 0
+
+    added = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_fetch_html, c["id"]): c for c in pending}
+        for fut in as_completed(futures):
+            campaign = futures[fut]
+            try:
+                html = fut.result()
+            except Exception as e:
+                print(f"[WARN] Could not fetch HTML for campaign {campaign['id']} (will retry next sync): {e}")
+                continue
+            n = _store_campaign(conn, campaign, html)
+            added += 1
+            print(f"[DEBUG] Archived campaign {campaign['id']} ({n} events)")
+    return added
+
+
+def reindex_archive(conn: sqlite3.Connection) -> int:
+    """
+    Re-extract the events of every archived campaign from its stored HTML, e.g. after a change
+    to extract_event_blocks. No API calls are made.
+    :return: Number of campaigns re-indexed
+    """
+    rows = conn.execute("SELECT meta, html FROM campaigns WHERE html IS NOT NULL").fetchall()
+    for r in rows:
+        _store_campaign(conn, json.loads(r["meta"]), r["html"])
+    return len(rows)
+
+
+def latest_archived_campaign(conn: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+    """
+    Return the most recently sent archived campaign, or None if the archive is empty.
+    :return: Dict with the campaigns.list metadata under 'meta' and the campaign HTML under 'html'
+    """
+    row = conn.execute(
+        "SELECT id, send_time, meta, html FROM campaigns WHERE html != '' ORDER BY send_time DESC LIMIT 1"
+    ).fetchone()
+    if row is None:
+        return None
+    return {"id": row["id"], "send_time": row["send_time"], "meta": json.loads(row["meta"]), "html": row["html"]}
+
+
+def event_already_ran(conn: sqlite3.Connection, title: str, link: str = "") -> bool:
+    """Check whether an event with this title (or registration link) appeared in any archived campaign."""
+    row = conn.execute("SELECT 1 FROM events WHERE title_norm = ? LIMIT 1", (normalize_title(title),)).fetchone()
+    if row is None and link:
+        row = conn.execute("SELECT 1 FROM events WHERE link = ? LIMIT 1", (link,)).fetchone()
+    return row is not None
+
+
+def search_events(conn: sqlite3.Connection, query: str, limit: int = 20) -> List[Dict[str, str]]:
+    """Full-text search over archived event blocks, best matches first."""
+    # Quote each term so user input can't be parsed as FTS query syntax
+    terms = " ".join('"' + t.replace('"', '""') + '"' for t in query.split())
+    if not terms:
+        return []
+    rows = conn.execute(
+        "SELECT e.campaign_id, c.send_time, e.title, e.link "
+        "FROM events_fts JOIN events e ON e.id = events_fts.rowid JOIN campaigns c ON c.id = e.campaign_id "
+        "WHERE events_fts MATCH ? ORDER BY rank LIMIT ?",
+        (terms, limit),
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+if __name__ == "__main__":
+    import sys
+
+    conn = open_archive()
+    if sys.argv[1:] == ["--reindex"]:
+        print(f"Re-indexed {reindex_archive(conn)} archived campaign(s)")
+        sys.exit(0)
+    added = sync_archive(conn)
+    total = conn.execute("SELECT COUNT(*) FROM campaigns").fetchone()[0]
+    print(f"Synced {added} new campaign(s); {total} in archive at {os.path.abspath(ARCHIVE_PATH)}")
+    if len(sys.argv) > 1:
+        for hit in search_events(conn, " ".join(sys.argv[1:])):
+            print(f"{hit['send_time']}  {hit['campaign_id']}  {hit['title']}  {hit['link']}")
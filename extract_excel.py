@@ -1,6 +1,10 @@
 import pandas as pd
 import requests
+import tempfile
 from io import BytesIO
+from typing import Iterator, List, Sequence
+
+from openpyxl import load_workbook
 
 def get_first_30_rows_from_excel(excel_url):
     """
@@ -13,6 +17,64 @@ def get_first_30_rows_from_excel(excel_url):
     df = pd.read_excel(BytesIO(response.content), engine='openpyxl')
     return df.head(30)
 
+
+def _dedupe_headers(header: Sequence) -> List[str]:
+    """
+    Name columns the way pd.read_excel does: blank headers become "Unnamed: <i>" and repeats
+    get ".1", ".2", ... suffixes (skipping names already used in the header), so labels are unique.
+    """
+    columns = [f"Unnamed: {i}" if h is None or str(h) == "" else str(h) for i, h in enumerate(header)]
+    taken = set(columns)
+    unnamed = [i for i, h in enumerate(header) if h is None or str(h) == ""]
+    named = [i for i, h in enumerate(header) if not (h is None or str(h) == "")]
+    counts = {}
+    # Named columns claim their names first, as in pandas
+    for i in named + unnamed:
+        name = base = columns[i]
+        n = counts.get(name, 0)
+        while n > 0:
+            counts[base] = n + 1
+            name = f"{base}.{n}"
+            n = n + 1 if name in taken else counts.get(name, 0)
+        columns[i] = name
+        counts[name] = n + 1
+    return columns
+
+
+def iter_excel_chunks(excel_url, chunk_size: int = 500) -> Iterator[pd.DataFrame]:
+    """
+    Stream the whole first sheet of the Excel file as DataFrames of at most chunk_size rows.
+    The download is spooled to a temp file and read in openpyxl read-only mode, so memory
+    stays bounded by the chunk size rather than the sheet size.
+    :param excel_url: Direct download link to the Excel file
+    :return: Iterator of DataFrames sharing the sheet's header row as columns
+    """
+    with requests.get(excel_url, stream=True) as response, tempfile.TemporaryFile() as tmp:
+        response.raise_for_status()
+        for block in response.iter_content(chunk_size=1 << 16):
+            tmp.write(block)
+        tmp.seek(0)
+        wb = load_workbook(tmp, read_only=True, data_only=True)
+        try:
+            rows = wb.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = _dedupe_headers(header)
+            chunk = []
+            for row in rows:
+                if all(v is None for v in row):
+                    continue
+                row = tuple(row[:len(columns)])
+                chunk.append(row + (None,) * (len(columns) - len(row)))
+                if len(chunk) >= chunk_size:
+                    yield pd.DataFrame.from_records(chunk, columns=columns)
+                    chunk = []
+            if chunk:
+                yield pd.DataFrame.from_records(chunk, columns=columns)
+        finally:
+            wb.close()
+
 if __name__ == "__main__":
     url = "https://penno365-my.sharepoint.com/:x:/g/personal/gapsa_pr_gapsa_upenn_edu/EWx0O2kdYFxOtPh92obhyNwBL73UMrhbNMyzRKcYLO87wA?download=1"
     df = get_first_30_rows_from_excel(url)
@@ -0,0 +1,199 @@
+import os
+import sys
+import json
+import time
+import difflib
+import hashlib
+import argparse
+from html.parser import HTMLParser
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Tuple, Optional, Any
+
+from automate_newsletter import update_html
+
+CORPUS_DIR = "golden"
+
+# (depth, class attribute, digest of every tag, attribute, comment and text run directly inside the table)
+TableSig = Tuple[int, str, str]
+
+
+class _TableParser(HTMLParser):
+    """
+    Collect one signature per <table>, in document order. Markup is charged to the innermost open
+    table; anything outside all tables goes to a depth -1 entry for the document itself.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        root = {"depth": -1, "cls": "(document)", "text": [], "tokens": []}
+        self.tables: List[Dict[str, Any]] = [root]
+        self._stack: List[Dict[str, Any]] = [root]
+
+    def handle_starttag(self, tag, attrs):
+        token = f"<{tag} {sorted(attrs, key=lambda kv: kv[0])!r}>"
+        if tag == "table":
+            entry = {"depth": len(self._stack) - 1, "cls": dict(attrs).get("class") or "", "text": [], "tokens": []}
+            self.tables.append(entry)
+            self._stack.append(entry)
+        self._stack[-1]["tokens"].append(token)
+
+    def handle_endtag(self, tag):
+        self._stack[-1]["tokens"].append(f"</{tag}>")
+        if tag == "table" and len(self._stack) > 1:
+            self._stack.pop()
+
+    def handle_comment(self, data):
+        self._stack[-1]["tokens"].append(f"<!--{data}-->")
+
+    def handle_data(self, data):
+        self._stack[-1]["tokens"].append(data)
+        if data.strip():
+            self._stack[-1]["text"].append(" ".join(data.split()))
+
+
+def table_signatures(html: str) -> Tuple[List[TableSig], List[str]]:
+    """Return per-table signatures plus a short text preview of each table for diff reports."""
+    p = _TableParser()
+    p.feed(html)
+    p.close()
+    sigs: List[TableSig] = []
+    previews: List[str] = []
+    for t in p.tables:
+        digest = hashlib.sha1("\x00".join(t["tokens"]).encode("utf-8")).hexdigest()[:12]
+        sigs.append((t["depth"], t["cls"], digest))
+        previews.append(" ".join(t["text"])[:80])
+    return sigs, previews
+
+
+def structural_diff(expected: str, actual: str) -> List[str]:
+    """Table-level diff between two documents; empty when every table matches."""
+    exp_sigs, exp_prev = table_signatures(expected)
+    act_sigs, act_prev = table_signatures(actual)
+    lines: List[str] = []
+    sm = difflib.SequenceMatcher(a=exp_sigs, b=act_sigs, autojunk=False)
+    for op, i1, i2, j1, j2 in sm.get_opcodes():
+        if op == "equal":
+            continue
+        for i in range(i1, i2):
+            d, cls, _ = exp_sigs[i]
+            lines.append(f"  - table #{i} depth={d} class={cls!r}: {exp_prev[i]!r}")
+        for j in range(j1, j2):
+            d, cls, _ = act_sigs[j]
+            lines.append(f"  + table #{j} depth={d} class={cls!r}: {act_prev[j]!r}")
+    return lines
+
+
+def _first_difference(expected: str, actual: str, context: int = 60) -> List[str]:
+    i = next((k for k, (x, y) in enumerate(zip(expected, actual)) if x != y), min(len(expected), len(actual)))
+    lo = max(0, i - context)
+    return [f"  first difference at offset {i}:",
+            f"  - {expected[lo:i + context]!r}",
+            f"  + {actual[lo:i + context]!r}"]
+
+
+def load_cases(corpus_dir: str = CORPUS_DIR, names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    cases = []
+    for fn in sorted(os.listdir(corpus_dir)):
+        if not fn.endswith(".json"):
+            continue
+        name = fn[:-len(".json")]
+        if names and name not in names:
+            continue
+        with open(os.path.join(corpus_dir, fn), "r", encoding="utf-8") as f:
+            case = json.load(f)
+        case["name"] = name
+        case["expected_path"] = os.path.join(corpus_dir, f"{name}.expected.html")
+        cases.append(case)
+    return cases
+
+
+def render_case(case: Dict[str, Any]) -> str:
+    with open(case["source"], "r", encoding="utf-8") as f:
+        source_html = f.read()
+    return update_html(source_html, case["header_date"], case["events"],
+                       case.get("more_events"), case.get("more_link", ""))
+
+
+def check_case(case: Dict[str, Any], repeat: int = 1, structural: bool = False) -> Dict[str, Any]:
+    """
+    Render a case `repeat` times (timing only the renders) and compare the result to its golden output.
+    Any byte difference fails; the table-level diff only localizes it. With `structural`, output whose
+    tables all match (same markup, attributes and text, modulo serialization) passes as well.
+    """
+    with open(case["source"], "r", encoding="utf-8") as f:
+        source_html = f.read()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        actual = update_html(source_html, case["header_date"], case["events"],
+                             case.get("more_events"), case.get("more_link", ""))
+    elapsed = time.perf_counter() - t0
+    with open(case["expected_path"], "r", encoding="utf-8", newline="") as f:
+        expected = f.read()
+    identical = actual == expected
+    diff = [] if identical else structural_diff(expected, actual)
+    ok = identical or (structural and not diff)
+    if not identical and not diff:
+        diff = _first_difference(expected, actual)
+    return {
+        "name": case["name"],
+        "ok": ok,
+        "identical": identical,
+        "diff": diff,
+        "seconds": elapsed,
+        "renders": repeat,
+        "bytes": len(source_html),
+    }
+
+
+def record(cases: List[Dict[str, Any]]) -> None:
+    """(Re)write golden outputs from the current update_html. Only do this for intended output changes."""
+    for case in cases:
+        with open(case["expected_path"], "w", encoding="utf-8", newline="") as f:
+            f.write(render_case(case))
+        print(f"Recorded {case['expected_path']}")
+
+
+def run(cases: List[Dict[str, Any]], repeat: int = 1, workers: Optional[int] = None, structural: bool = False) -> bool:
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(check_case, cases, [repeat] * len(cases), [structural] * len(cases)))
+    wall = time.perf_counter() - t0
+
+    for r in results:
+        status = "ok" if r["identical"] else ("ok (bytes differ, tables match)" if r["ok"] else "FAIL")
+        print(f"{r['name']:<40} {status:<32} {r['renders'] / r['seconds']:>8.1f} docs/s")
+        for line in r["diff"]:
+            print(line)
+
+    total = sum(r["renders"] for r in results)
+    cpu = sum(r["seconds"] for r in results)
+    mb = sum(r["bytes"] * r["renders"] for r in results) / 1e6
+    failed = [r["name"] for r in results if not r["ok"]]
+    print(f"\n{len(results) - len(failed)}/{len(results)} cases pass; {total} renders in {wall:.2f}s wall "
+          f"({total / wall:.1f} docs/s, {mb / wall:.1f} MB/s); single-core render rate {total / cpu:.1f} docs/s")
+    return not failed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay the golden corpus through update_html.")
+    parser.add_argument("cases", nargs="*", help="case names to run (default: all)")
+    parser.add_argument("--corpus", default=CORPUS_DIR)
+    parser.add_argument("--repeat", type=int, default=1, help="renders per case, for throughput numbers")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--record", action="store_true", help="rewrite golden outputs from the current code")
+    parser.add_argument("--structural", action="store_true",
+                        help="also pass output that differs in bytes but matches table by table")
+    args = parser.parse_args(argv)
+
+    cases = load_cases(args.corpus, args.cases)
+    if not cases:
+        print(f"No golden cases found in {args.corpus}/")
+        return 2
+    if args.record:
+        record(cases)
+        return 0
+    return 0 if run(cases, repeat=args.repeat, workers=args.workers, structural=args.structural) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Iterable, Optional, Any
+from urllib.parse import urlsplit
+
+import requests
+
+CACHE_PATH = os.path.join("artifacts", "link_cache.json")
+CACHE_TTL = 24 * 3600  # seconds before a cached result is re-checked
+TIMEOUT = 10
+MAX_WORKERS = 16
+PER_HOST_LIMIT = 4
+
+HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; GAPSA-newsletter-link-check)"}
+
+# Servers that reject HEAD outright; retry those with a streamed GET
+HEAD_REJECTED = {403, 405, 501}
+# Client errors that won't fix themselves; cached like successes. 5xx and network errors are
+# often transient, so those are re-checked on the next run.
+PERMANENT_ERRORS = {404, 410}
+
+
+def load_cache(path: str = CACHE_PATH) -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache: Dict[str, Dict[str, Any]], path: str = CACHE_PATH) -> None:
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _host_key(url: str) -> str:
+    # Placeholder links from the form (e.g. "https://[TBD]") make urlsplit raise
+    try:
+        return urlsplit(url).netloc.lower()
+    except ValueError:
+        return ""
+
+
+def check_link(url: str, timeout: float = TIMEOUT, session: Optional[requests.Session] = None) -> Dict[str, Any]:
+    """
+    Resolve a single URL, following redirects.
+    :return: Dict with url, final_url, status (0 on network error), redirects (list of hops),
+             error and checked_at (epoch seconds)
+    """
+    http = session or requests
+    result: Dict[str, Any] = {"url": url, "final_url": url, "status": 0, "redirects": [], "error": "",
+                              "checked_at": time.time()}
+    try:
+        r = http.head(url, allow_redirects=True, timeout=timeout, headers=HEADERS)
+        if r.status_code in HEAD_REJECTED:
+            r = http.get(url, allow_redirects=True, timeout=timeout, headers=HEADERS, stream=True)
+            r.close()
+    except (requests.RequestException, ValueError) as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+    result["final_url"] = r.url
+    result["status"] = r.status_code
+    result["redirects"] = [{"url": h.url, "status": h.status_code} for h in r.history]
+    return result
+
+
+def is_ok(result: Dict[str, Any]) -> bool:
+    return 200 <= (result.get("status") or 0) < 400
+
+
+def _host_lanes(urls: List[str], per_host: int) -> List[List[str]]:
+    """
+    Split URLs into lanes of work, at most `per_host` lanes per host, interleaved across hosts.
+    Each lane is checked sequentially by one worker, so a busy host never holds more than
+    `per_host` workers and other hosts' lanes are not queued behind it.
+    """
+    by_host: Dict[str, List[str]] = {}
+    for u in urls:
+        by_host.setdefault(_host_key(u), []).append(u)
+    per_host_lanes = []
+    for host_urls in by_host.values():
+        n = min(per_host, len(host_urls))
+        per_host_lanes.append([host_urls[i::n] for i in range(n)])
+    # Round-robin so the first lanes submitted cover as many hosts as possible
+    return [lanes[i] for i in range(per_host) for lanes in per_host_lanes if i < len(lanes)]
+
+
+def _check_lane(lane: List[str], timeout: float) -> List[Dict[str, Any]]:
+    # One session per lane: lanes are per host, so connections get reused
+    with requests.Session() as session:
+        return [check_link(url, timeout=timeout, session=session) for url in lane]
+
+
+def check_links(urls: Iterable[str], timeout: float = TIMEOUT, max_workers: int = MAX_WORKERS,
+                per_host: int = PER_HOST_LIMIT, cache_path: Optional[str] = CACHE_PATH,
+                ttl: float = CACHE_TTL) -> Dict[str, Dict[str, Any]]:
+    """
+    Check many URLs concurrently, at most `per_host` in flight per host. Results younger than
+    `ttl` are served from the cache at `cache_path` (pass None to disable caching); older
+    entries are dropped from it.
+    :return: Mapping of url -> check_link result
+    """
+    unique = [u for u in dict.fromkeys(urls) if u]
+    cache = load_cache(cache_path) if cache_path else {}
+    now = time.time()
+    # Drop expired entries so the cache doesn't keep every link ever checked
+    fresh = {u: res for u, res in cache.items() if now - res.get("checked_at", 0) < ttl}
+    evicted = len(cache) - len(fresh)
+    cache = fresh
+    results = {u: cache[u] for u in unique if u in cache}
+    todo = [u for u in unique if u not in results]
+
+    if todo:
+        lanes = _host_lanes(todo, per_host)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for res in (r for lane_results in pool.map(lambda lane: _check_lane(lane, timeout), lanes)
+                        for r in lane_results):
+                url = res["url"]
+                results[url] = res
+                if is_ok(res) or res["status"] in PERMANENT_ERRORS:
+                    cache[url] = res
+    if cache_path and (todo or evicted):
+        save_cache(cache, cache_path)
+    return results
+
+
+def check_event_links(events: List[Dict[str, str]], rewrite: bool = False, **kwargs) -> List[Dict[str, str]]:
+    """
+    Check every event's link, warn about broken ones and, if `rewrite` is set, replace links
+    that redirect with their final URL so readers skip the hops.
+    :return: New list of event dicts (inputs are not modified)
+    """
+    results = check_links((ev.get("link") or "" for ev in events), **kwargs)
+    checked: List[Dict[str, str]] = []
+    for ev in events:
+        ev = dict(ev)
+        res = results.get(ev.get("link") or "")
+        if res is not None:
+            if not is_ok(res):
+                why = res["error"] or f"HTTP {res['status']}"
+                print(f"[WARN] Event link looks broken ({why}): {ev.get('title')!r} -> {res['url']}")
+            elif rewrite and res["redirects"] and res["final_url"] != res["url"]:
+                print(f"[DEBUG] Rewriting {res['url']} -> {res['final_url']} ({len(res['redirects'])} redirects)")
+                ev["link"] = res["final_url"]
+        checked.append(ev)
+    return checked
+
+
+if __name__ == "__main__":
+    import sys
+
+    for url, res in check_links(sys.argv[1:], cache_path=None).items():
+        hops = " -> ".join(h["url"] for h in res["redirects"])
+        print(f"{res['status'] or 'ERR'}  {url}  =>  {res['final_url']}  {res['error']}{'  via ' + hops if hops else ''}")
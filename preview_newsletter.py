@@ -0,0 +1,123 @@
+import os
+import sys
+import argparse
+from datetime import datetime, date, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+from automate_newsletter import (
+    MAX_EVENTS,
+    MAX_MORE_EVENTS,
+    apply_html_edits,
+    build_html_edits,
+    format_header_date,
+    parse_upcoming_events,
+    select_upcoming_rows,
+    tomorrow_eastern,
+    write_html,
+)
+from campaign_archive import open_archive, latest_archived_campaign
+from extract_excel import iter_excel_chunks
+from get_latest_campaign import get_latest_campaign, mailchimp
+from run_newsletter_automation import EXCEL_URL
+from template_regions import find_header_span, find_events_region
+
+# Shared per-worker state, set once by _init_worker so the template, its located slots and
+# the sheet are pickled to each process once instead of once per issue date.
+_SOURCE_HTML = ""
+_HEADER_SPAN: Optional[Tuple[int, int]] = None
+_EVENTS_REGION: Optional[Tuple[int, int]] = None
+_DF: Optional[pd.DataFrame] = None
+_OUT_DIR = "artifacts"
+_MORE_LINK = ""
+
+
+def _init_worker(source_html: str, header_span: Optional[Tuple[int, int]], events_region: Optional[Tuple[int, int]],
+                 df: pd.DataFrame, out_dir: str, more_link: str) -> None:
+    global _SOURCE_HTML, _HEADER_SPAN, _EVENTS_REGION, _DF, _OUT_DIR, _MORE_LINK
+    _SOURCE_HTML, _HEADER_SPAN, _EVENTS_REGION = source_html, header_span, events_region
+    _DF, _OUT_DIR, _MORE_LINK = df, out_dir, more_link
+
+
+def render_preview(issue_date: date) -> str:
+    """Render the issue going out on issue_date and write it to the output dir; returns the file path."""
+    # An issue lists events strictly after the day before it is sent, same as the live run
+    events = parse_upcoming_events(_DF, today=issue_date - timedelta(days=1))
+    events, more_events = events[:MAX_EVENTS], events[MAX_EVENTS:MAX_EVENTS + MAX_MORE_EVENTS]
+    header_date = format_header_date(datetime(issue_date.year, issue_date.month, issue_date.day))
+    path = os.path.join(_OUT_DIR, f"preview_{issue_date:%Y%m%d}.html")
+    # The template was searched once in preview_range; only the event pieces differ per date
+    edits = build_html_edits(_HEADER_SPAN, _EVENTS_REGION, header_date, events, more_events, _MORE_LINK)
+    write_html(path, apply_html_edits(_SOURCE_HTML, edits))
+    return path
+
+
+def issue_dates(start: date, days: int, every: int = 1) -> List[date]:
+    return [start + timedelta(days=i) for i in range(0, days, every)]
+
+
+def load_source_html(archive_path: Optional[str] = None) -> str:
+    """Template HTML from the newest archived campaign if an archive is given, else from the API."""
+    if archive_path:
+        archived = latest_archived_campaign(open_archive(archive_path))
+        if archived:
+            return archived["html"]
+        print("[WARN] Campaign archive is empty; fetching the latest campaign from Mailchimp.")
+    latest = get_latest_campaign()
+    if not latest:
+        return ""
+    return mailchimp.campaigns.get_content(latest["id"]).get("html", "") or ""
+
+
+def preview_range(dates: List[date], excel_url: str = EXCEL_URL, archive_path: Optional[str] = None,
+                  out_dir: str = "artifacts", more_link: str = "", workers: Optional[int] = None) -> List[str]:
+    """
+    Render previews for every date in `dates` on a process pool, fetching the template and the
+    sheet and locating the template's header and events slots once up front, shared by all workers.
+    :return: Paths of the written preview files, in date order
+    """
+    if not dates:
+        return []
+    source_html = load_source_html(archive_path)
+    if not source_html:
+        raise RuntimeError("No source campaign HTML available to render previews from.")
+    header_span, events_region = find_header_span(source_html), find_events_region(source_html)
+
+    # Keep every event upcoming as of the earliest issue; each date then picks its own top K
+    df = select_upcoming_rows(iter_excel_chunks(excel_url), k=None, today=min(dates) - timedelta(days=1))
+
+    os.makedirs(out_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(source_html, header_span, events_region, df, out_dir, more_link)) as pool:
+        return list(pool.map(render_preview, dates))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Render newsletter previews for a range of issue dates.")
+    parser.add_argument("--start", type=date.fromisoformat, help="first issue date, YYYY-MM-DD (default: tomorrow ET)")
+    parser.add_argument("--days", type=int, default=14, help="number of days to cover (default: 14)")
+    parser.add_argument("--every", type=int, default=1, help="days between issues (default: 1)")
+    parser.add_argument("--backfill-weeks", type=int, help="cover the past N weeks up to tomorrow instead")
+    parser.add_argument("--archive", metavar="PATH", help="take the template from this campaign archive")
+    parser.add_argument("--out-dir", default="artifacts")
+    parser.add_argument("--more-link", default="", help="link appended to the 'More Upcoming Events' digest")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    tomorrow = tomorrow_eastern().date()
+    if args.backfill_weeks:
+        start, days = tomorrow - timedelta(weeks=args.backfill_weeks), 7 * args.backfill_weeks + 1
+    else:
+        start, days = args.start or tomorrow, args.days
+
+    paths = preview_range(issue_dates(start, days, args.every), archive_path=args.archive,
+                          out_dir=args.out_dir, more_link=args.more_link, workers=args.workers)
+    for p in paths:
+        print(f"Wrote preview: {p}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
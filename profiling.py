@@ -0,0 +1,179 @@
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, List, Optional, Tuple
+
+PROFILE_ENV = "NEWSLETTER_PROFILE"
+TOP_N = 25
+
+_enabled = False
+# stage name -> {"calls": int, "seconds": float, "alloc_bytes": int, "peak_bytes": int}
+_stages: Dict[str, Dict[str, float]] = {}
+# stage name -> {(filename, lineno): bytes still held at stage exit, summed over calls}
+_stage_sites: Dict[str, Dict[Tuple[str, int], int]] = {}
+# (stage name, snapshot at entry, snapshot at exit); diffed into _stage_sites once the run is over
+_stage_snapshots: List[Tuple[str, tracemalloc.Snapshot, tracemalloc.Snapshot]] = []
+# The running cProfile.Profile, if any, so snapshots can be taken with it paused
+_cprofile = None
+# Highest traced memory seen so far; stage() resets tracemalloc's own peak on entry
+_overall_peak = 0
+# Keep the profiler's own bookkeeping (snapshots, stats) out of the reports. Checked by hand:
+# tracemalloc.Filter goes through fnmatch, whose regex compiles would show up as allocations.
+_OWN_FILES = {tracemalloc.__file__, __file__}
+_NULL = nullcontext()
+
+
+def env_enabled() -> bool:
+    return os.getenv(PROFILE_ENV, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    # Keep snapshot work out of the CPU profile (pyinstrument samples can't be paused; its
+    # report shows the time under profiling.py)
+    if _cprofile is not None:
+        _cprofile.disable()
+    try:
+        return tracemalloc.take_snapshot()
+    finally:
+        if _cprofile is not None:
+            _cprofile.enable()
+
+
+def _diff_stage_snapshots() -> None:
+    """Attribute what each stage held on exit to the lines that allocated it."""
+    for name, snap0, snap1 in _stage_snapshots:
+        sites = _stage_sites.setdefault(name, {})
+        for d in snap1.compare_to(snap0, "lineno"):
+            frame = d.traceback[0]
+            if d.size_diff and frame.filename not in _OWN_FILES:
+                key = (frame.filename, frame.lineno)
+                sites[key] = sites.get(key, 0) + d.size_diff
+    _stage_snapshots.clear()
+
+
+class _Stage:
+    __slots__ = ("name", "t0", "m0", "snap0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        global _overall_peak
+        _overall_peak = max(_overall_peak, tracemalloc.get_traced_memory()[1])
+        self.snap0 = _take_snapshot()
+        # Measured after the snapshot so the snapshot itself isn't charged to the stage
+        self.m0 = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        global _overall_peak
+        elapsed = time.perf_counter() - self.t0
+        current, peak = tracemalloc.get_traced_memory()
+        _overall_peak = max(_overall_peak, peak)
+        # Diffing is deferred to the end of the run, outside the profiled region
+        _stage_snapshots.append((self.name, self.snap0, _take_snapshot()))
+        del self.snap0
+        st = _stages.setdefault(self.name, {"calls": 0, "seconds": 0.0, "alloc_bytes": 0, "peak_bytes": 0})
+        st["calls"] += 1
+        st["seconds"] += elapsed
+        st["alloc_bytes"] += current - self.m0
+        st["peak_bytes"] = max(st["peak_bytes"], peak - self.m0)
+        return False
+
+
+def stage(name: str):
+    """
+    Attribute wall time, net traced allocations and peak memory above the starting level inside
+    the block to a named pipeline stage, plus the allocation sites still holding memory at exit
+    (snapshot diff against entry, computed once the run is over so it stays out of the CPU
+    profile). Memory freed before the block exits only shows in the peak.
+    Stages are not meant to nest (each one resets the tracemalloc peak). Returns a shared no-op
+    context when profiling is off.
+    """
+    return _Stage(name) if _enabled else _NULL
+
+
+def _start_cpu_profiler():
+    # Prefer a sampling profiler when installed; fall back to the stdlib's deterministic cProfile
+    try:
+        from pyinstrument import Profiler
+        prof = Profiler()
+        prof.start()
+        return "pyinstrument", prof
+    except ImportError:
+        import cProfile
+        prof = cProfile.Profile()
+        prof.enable()
+        return "cprofile", prof
+
+
+def _stop_cpu_profiler(kind: str, prof, out_dir: str, tag: str) -> str:
+    if kind == "pyinstrument":
+        prof.stop()
+        path = os.path.join(out_dir, f"profile_{tag}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(prof.output_html())
+    else:
+        prof.disable()
+        path = os.path.join(out_dir, f"profile_{tag}.prof")
+        prof.dump_stats(path)
+    return path
+
+
+def _format_report(snapshot: tracemalloc.Snapshot, peak: int, top_n: int) -> List[str]:
+    lines = ["== Pipeline stages ==", f"{'stage':<32}{'calls':>6}{'seconds':>10}{'net KiB':>12}{'peak KiB':>12}"]
+    for name, st in sorted(_stages.items(), key=lambda kv: kv[1]["seconds"], reverse=True):
+        lines.append(f"{name:<32}{int(st['calls']):>6}{st['seconds']:>10.3f}"
+                     f"{st['alloc_bytes'] / 1024:>12.1f}{st['peak_bytes'] / 1024:>12.1f}")
+    for name, sites in _stage_sites.items():
+        top = sorted(sites.items(), key=lambda kv: abs(kv[1]), reverse=True)[:top_n]
+        if not top:
+            continue
+        lines += ["", f"== {name}: top {len(top)} allocation sites held at stage exit =="]
+        for (filename, lineno), size in top:
+            lines.append(f"{size / 1024:>+10.1f} KiB  {filename}:{lineno}")
+    lines += ["", f"== Top {top_n} allocation sites retained at end of run (peak traced {peak / 1024:.1f} KiB) =="]
+    retained = [s for s in snapshot.statistics("lineno") if s.traceback[0].filename not in _OWN_FILES]
+    for s in retained[:top_n]:
+        frame = s.traceback[0]
+        lines.append(f"{s.size / 1024:>10.1f} KiB {s.count:>8} blocks  {frame.filename}:{frame.lineno}")
+    return lines
+
+
+@contextmanager
+def profile_run(out_dir: str = "artifacts", tag: Optional[str] = None, top_n: int = TOP_N) -> Iterator[Dict[str, str]]:
+    """
+    Profile everything inside the block: CPU profile plus tracemalloc, with per-stage totals from stage().
+    On exit writes profile_<tag>.(prof|html) and alloc_<tag>.txt to out_dir. The yielded dict is
+    filled with those paths once the block finishes.
+    """
+    global _enabled, _overall_peak, _cprofile
+    tag = tag or time.strftime("%Y%m%d_%H%M%S")
+    os.makedirs(out_dir, exist_ok=True)
+    paths: Dict[str, str] = {}
+    _stages.clear()
+    _stage_sites.clear()
+    _stage_snapshots.clear()
+    _overall_peak = 0
+    tracemalloc.start()
+    kind, prof = _start_cpu_profiler()
+    _cprofile = prof if kind == "cprofile" else None
+    _enabled = True
+    try:
+        yield paths
+    finally:
+        _enabled = False
+        # Snapshot before stopping the CPU profiler so its own output isn't counted
+        snapshot = _take_snapshot()
+        peak = max(_overall_peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        _cprofile = None
+        paths["profile"] = _stop_cpu_profiler(kind, prof, out_dir, tag)
+        # Stage diffs run after the CPU profiler has stopped, so they don't show up in it
+        _diff_stage_snapshots()
+        paths["alloc"] = os.path.join(out_dir, f"alloc_{tag}.txt")
+        with open(paths["alloc"], "w", encoding="utf-8") as f:
+            f.write("\n".join(_format_report(snapshot, peak, top_n)) + "\n")
@@ -1,8 +1,11 @@
 import os
 import sys
 from datetime import datetime
+from typing import Optional
 
 from automate_newsletter import replicate_update_and_optionally_schedule
+from campaign_archive import ARCHIVE_PATH
+from profiling import env_enabled, profile_run
 
 # Excel link (public, direct download)
 EXCEL_URL = (
@@ -10,10 +13,23 @@ EXCEL_URL = (
     "EWx0O2kdYFxOtPh92obhyNwBL73UMrhbNMyzRKcYLO87wA?download=1"
 )
 
+# Path of a campaign archive to take the source campaign from (see campaign_archive.py)
+ARCHIVE_ENV = "NEWSLETTER_ARCHIVE"
 
-def main() -> int:
+
+def main(profile: bool = False, archive_path: Optional[str] = None) -> int:
     os.makedirs("artifacts", exist_ok=True)
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if profile:
+        # Profile files share the run's timestamp so they sit next to its log in artifacts/
+        with profile_run("artifacts", tag=ts) as paths:
+            code = _run(ts, archive_path)
+        print(f"Profile written to {paths['profile']}; stage + allocation report at {paths['alloc']}")
+        return code
+    return _run(ts, archive_path)
+
+
+def _run(ts: str, archive_path: Optional[str] = None) -> int:
     log_path = os.path.join("artifacts", f"run_{ts}.log")
 
     def log(msg: str):
@@ -27,7 +43,7 @@ def main() -> int:
 
     log("Starting GAPSA newsletter automation (replicate + update + schedule)...")
     try:
-        new_id = replicate_update_and_optionally_schedule(EXCEL_URL, dry_run=False)
+        new_id = replicate_update_and_optionally_schedule(EXCEL_URL, dry_run=False, archive_path=archive_path)
         if not new_id:
             log("Failed: replicate_update_and_optionally_schedule returned no campaign id.")
             return 2
@@ -41,5 +57,8 @@ def main() -> int:
 
 
 if __name__ == "__main__":
-    sys.exit(main())
+    # Opt-in profiling: pass --profile or set NEWSLETTER_PROFILE=1
+    # Opt-in archive source: pass --archive (default path) or set NEWSLETTER_ARCHIVE=<path>
+    archive = ARCHIVE_PATH if "--archive" in sys.argv[1:] else (os.getenv(ARCHIVE_ENV) or None)
+    sys.exit(main(profile="--profile" in sys.argv[1:] or env_enabled(), archive_path=archive))
 
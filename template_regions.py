@@ -0,0 +1,179 @@
+import re
+from typing import Optional, Tuple
+
+# Locating the editable slots of a newsletter template: the header date span and the events
+# region between the top dividers and the divider above the Mantra Health block.
+
+HEADER_SPAN_RE = re.compile(r"(<span[^>]*font-size:\s*24px[^>]*>)(.*?)(</span>)", re.IGNORECASE | re.DOTALL)
+MANTRA_RE = re.compile(re.escape("access support with mantra health"), re.IGNORECASE)
+# Headlines of the seasonal wellness promo that can sit between the last event and the Mantra block
+PROMO_HEADLINES = ("Stay Healthy", "Connected This Summer")
+
+
+def find_nth(hay: str, needle: str, n: int, start: int = 0) -> int:
+    idx = start
+    for _ in range(n):
+        idx = hay.find(needle, idx)
+        if idx == -1:
+            return -1
+        idx += len(needle)
+    return idx - len(needle)
+
+
+TABLE_TOKEN_RE = re.compile(r"<table|</table>", re.IGNORECASE)
+
+
+def find_table_block_bounds(html: str, table_start_idx: int) -> Tuple[int, int]:
+    """Return (start, end) indices for the outer <table ...>...</table> block starting at given '<table' index."""
+    start = html.rfind("<table", 0, table_start_idx + 1)
+    if start == -1:
+        start = table_start_idx
+    depth = 0
+    i = start
+    for m in TABLE_TOKEN_RE.finditer(html, i):
+        token = m.group(0).lower()
+        if token == "<table":
+            depth += 1
+            if depth == 1:
+                start = m.start()
+        else:
+            depth -= 1
+            if depth == 0:
+                end = m.end()
+                return (start, end)
+    return (start, start)
+
+
+def find_divider_table_open_start(html: str, class_idx: int) -> int:
+    """Given an index of 'class="mcnDividerBlock"', find the opening '<table' start of that divider block."""
+    i = class_idx
+    while True:
+        lt = html.rfind('<table', 0, i + 1)
+        if lt == -1:
+            return -1
+        gt = html.find('>', lt)
+        if gt == -1:
+            return -1
+        opening = html[lt:gt].lower()
+        if 'class="mcndividerblock"' in opening:
+            return lt
+        # keep searching earlier tables
+        i = lt - 1
+
+
+
+def find_enclosing_table_open(html: str, pos: int) -> int:
+    """Find the opening index of the outermost <table ...> whose bounds enclose pos.
+    Returns -1 if not found.
+    """
+    # Walk backwards through table openings until we find one whose closing </table> is after pos
+    search_end = pos
+    while True:
+        t_open = html.rfind('<table', 0, search_end)
+        if t_open == -1:
+            return -1
+        t_start, t_end = find_table_block_bounds(html, t_open)
+        if t_end > pos >= t_start:
+            # Found a table that encloses pos; try to see if there is a larger enclosing one
+            # Continue searching before this start to see if there's an outer table also enclosing pos
+            outer_open = html.rfind('<table', 0, t_start)
+            if outer_open == -1:
+                return t_start
+            outer_bounds = find_table_block_bounds(html, outer_open)
+            if outer_bounds[1] > pos >= outer_bounds[0]:
+                # Move outward
+                search_end = outer_open
+                continue
+            else:
+                return t_start
+        else:
+            # Move further back
+            search_end = t_open
+
+
+def find_header_span(html: str, warn: bool = True) -> Optional[Tuple[int, int]]:
+    """Return (start, end) of the header date text inside #templateHeader (the span with font-size:24px)."""
+    header_idx = html.find('id="templateHeader"')
+    if header_idx == -1:
+        if warn:
+            print("[WARN] #templateHeader not found; leaving header date unchanged.")
+        return None
+    # limit search to a window after header_idx
+    window_end = html.find('id="templateBody"', header_idx)
+    window_end = window_end if window_end != -1 else header_idx + 8000
+    m = HEADER_SPAN_RE.search(html, header_idx, window_end)
+    if not m:
+        if warn:
+            print("[WARN] Could not locate header date span; leaving as-is.")
+        return None
+    return (m.start(2), m.end(2))
+
+
+def find_events_region(html: str, warn: bool = True) -> Optional[Tuple[int, int]]:
+    """
+    Return (start, end) of the events section: from the end of the second top divider to the divider
+    before the Mantra Health block. None (with a warning unless warn=False) if the template doesn't match.
+    """
+    def skip(msg: str) -> None:
+        if warn:
+            print(f"[WARN] {msg}; skipping events replacement.")
+
+    body_idx = html.find('id="templateBody"')
+    if body_idx == -1:
+        skip("#templateBody not found")
+        return None
+
+    # Find first two mcnDividerBlock occurrences after body
+    first_div_class_idx = html.find('class="mcnDividerBlock"', body_idx)
+    second_div_class_idx = html.find('class="mcnDividerBlock"', first_div_class_idx + 1) if first_div_class_idx != -1 else -1
+    if first_div_class_idx == -1 or second_div_class_idx == -1:
+        skip("Could not find two top divider blocks")
+        return None
+
+    # Compute the exact end of the second divider table
+    second_div_open = find_divider_table_open_start(html, second_div_class_idx)
+    if second_div_open == -1:
+        skip("Could not find opening <table for the second divider")
+        return None
+    start_delete_bounds = find_table_block_bounds(html, second_div_open)
+    start_delete = start_delete_bounds[1]  # after the second divider table
+
+    # Find Mantra block heading (case-insensitive search, no lowercase copy of the document)
+    mantra_m = MANTRA_RE.search(html, start_delete)
+    if mantra_m is None:
+        skip("Mantra Health block not found")
+        return None
+    mantra_idx = mantra_m.start()
+
+    # Iterate to find the divider that is immediately above the Mantra block
+    scan_pos = start_delete
+    last_div_open = -1
+    while True:
+        idx = html.find('class="mcnDividerBlock"', scan_pos)
+        if idx == -1 or idx >= mantra_idx:
+            break
+        div_open = find_divider_table_open_start(html, idx)
+        if div_open != -1:
+            last_div_open = div_open
+        scan_pos = idx + 1
+
+    if last_div_open == -1:
+        skip("Divider above Mantra not found during scan")
+        return None
+
+    end_delete_bounds = find_table_block_bounds(html, last_div_open)
+    # end_delete should be the start of the divider table RIGHT BEFORE the Mantra section,
+    # so deletion will remove everything up to (but not including) that divider.
+    end_delete = end_delete_bounds[0]
+
+    # If there is any stray content like a 'right-variant' block still between end_delete and the Mantra heading,
+    # broaden to the enclosing table that contains the Mantra heading and step back to the previous divider.
+    # (Safety: only do this if we still detect the "Stay Healthy" headline in between.)
+    if any(html.find(p, end_delete, mantra_idx) != -1 for p in PROMO_HEADLINES):
+        # Move end_delete earlier to the last divider before mantra (already is), but ensure we did not start too late
+        # by recapturing the enclosing table of the Mantra heading and not overlapping.
+        enclosing_open = find_enclosing_table_open(html, mantra_idx)
+        if enclosing_open != -1 and enclosing_open < mantra_idx and enclosing_open > end_delete:
+            end_delete = enclosing_open
+
+    return (start_delete, end_delete)
@@ -0,0 +1,136 @@
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import link_checker
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    """Local stand-in for registration sites: /rN redirects N times to /ok."""
+
+    hits = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, head: bool):
+        type(self).hits += 1
+        path = self.path
+        if path.startswith("/r") and path[2:].isdigit():
+            n = int(path[2:])
+            self.send_response(302)
+            self.send_header("Location", f"/r{n - 1}" if n > 1 else "/ok")
+        elif path == "/ok":
+            self.send_response(200)
+        elif path == "/nohead":
+            self.send_response(405 if head else 200)
+        elif path == "/flaky":
+            self.send_response(503)
+        else:
+            self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._respond(head=True)
+
+    def do_GET(self):
+        self._respond(head=False)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LinkCheckerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_path = os.path.join(tmp.name, "link_cache.json")
+
+    def check(self, *urls, **kwargs):
+        kwargs.setdefault("cache_path", None)
+        kwargs.setdefault("timeout", 5)
+        return link_checker.check_links(urls, **kwargs)
+
+    def test_redirect_chain_is_recorded(self):
+        res = self.check(self.base + "/r3")[self.base + "/r3"]
+        self.assertEqual(res["status"], 200)
+        self.assertEqual(res["final_url"], self.base + "/ok")
+        self.assertEqual([h["url"] for h in res["redirects"]],
+                         [self.base + "/r3", self.base + "/r2", self.base + "/r1"])
+
+    def test_not_found(self):
+        res = self.check(self.base + "/missing")[self.base + "/missing"]
+        self.assertEqual(res["status"], 404)
+        self.assertFalse(link_checker.is_ok(res))
+
+    def test_head_rejected_falls_back_to_get(self):
+        res = self.check(self.base + "/nohead")[self.base + "/nohead"]
+        self.assertEqual(res["status"], 200)
+
+    def test_connection_refused(self):
+        url = f"http://127.0.0.1:{_free_port()}/x"
+        res = self.check(url)[url]
+        self.assertEqual(res["status"], 0)
+        self.assertIn("ConnectionError", res["error"])
+
+    def test_malformed_url_is_reported_not_raised(self):
+        urls = ["https://[TBD]", "https://[insert link]/x"]
+        results = self.check(*urls)
+        for url in urls:
+            self.assertEqual(results[url]["status"], 0)
+            self.assertTrue(results[url]["error"])
+
+    def test_cache_hits_within_ttl(self):
+        urls = [self.base + "/ok", self.base + "/missing", self.base + "/flaky"]
+        self.check(*urls, cache_path=self.cache_path)
+        _StandIn.hits = 0
+        results = self.check(*urls, cache_path=self.cache_path)
+        # Only the transient 503 is re-checked; the 200 and the 404 come from the cache
+        self.assertEqual(_StandIn.hits, 1)
+        self.assertEqual(results[self.base + "/flaky"]["status"], 503)
+        _StandIn.hits = 0
+        self.check(self.base + "/ok", cache_path=self.cache_path, ttl=0)
+        self.assertEqual(_StandIn.hits, 1)
+
+    def test_expired_entries_are_evicted(self):
+        self.check(self.base + "/ok", self.base + "/missing", cache_path=self.cache_path)
+        cache = link_checker.load_cache(self.cache_path)
+        cache[self.base + "/missing"]["checked_at"] -= 2 * link_checker.CACHE_TTL
+        link_checker.save_cache(cache, self.cache_path)
+        self.check(self.base + "/ok", cache_path=self.cache_path)
+        self.assertEqual(list(link_checker.load_cache(self.cache_path)), [self.base + "/ok"])
+
+    def test_rewrite_event_links_to_final_url(self):
+        events = [{"title": "A", "link": self.base + "/r2"}, {"title": "B", "link": self.base + "/missing"}]
+        checked = link_checker.check_event_links(events, rewrite=True, cache_path=None, timeout=5)
+        self.assertEqual(checked[0]["link"], self.base + "/ok")
+        self.assertEqual(checked[1]["link"], self.base + "/missing")
+        self.assertEqual(events[0]["link"], self.base + "/r2")
+
+    def test_per_host_lanes_interleave_hosts(self):
+        busy = [f"http://a.example/{i}" for i in range(8)]
+        lanes = link_checker._host_lanes(busy + ["http://b.example/0"], per_host=2)
+        self.assertEqual(len(lanes), 3)
+        self.assertEqual(lanes[1], ["http://b.example/0"])
+
+
+if __name__ == "__main__":
+    unittest.main()